@@ -1,70 +1,511 @@
 # ai-service/app.py
 from flask import Flask, request, jsonify
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
+import orjson
 import numpy as np
-import pandas as pd
-import pickle
-import json
 import logging
+import re
+import hashlib
+import importlib.util
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-import requests
-from sklearn.ensemble import RandomForestRegressor, GradientBoostingClassifier
-from sklearn.preprocessing import StandardScaler
-import tensorflow as tf
-from tensorflow import keras
-import cv2
 import base64
-from PIL import Image
-import io
+import ahocorasick
 import threading
 import time
+import os
+import tempfile
+import urllib.request
+
+try:
+    # oneDAL-accelerated estimators, must be patched before sklearn imports
+    from sklearnex import patch_sklearn
+    patch_sklearn()
+except ImportError:
+    pass
+from sklearn.ensemble import RandomForestRegressor, GradientBoostingClassifier
+from sklearn.preprocessing import StandardScaler
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
 
-app = Flask(_name_)
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson"""
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+app = Flask(__name__)
+app.json = OrjsonProvider(app)
 CORS(app)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(_name_)
+logger = logging.getLogger(__name__)
 
 # Global variables for models
 threat_model = None
 severity_model = None
 image_model = None
-scaler = StandardScaler()
+imagenet_labels = None
+scaler = None
+_MEAN = None
+_SCALE = None
+
+# Compiled model cache
+MODEL_DIR = os.environ.get('MODEL_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models'))
+IMAGE_MODEL_BACKEND = os.environ.get('IMAGE_MODEL_BACKEND', 'tflite')  # 'tflite', 'onnx', 'edgetpu' or 'xla'
+IMAGE_MODEL_PRECISION = os.environ.get('IMAGE_MODEL_PRECISION', 'int8')  # 'int8' or 'fp16'
+GPU_DELEGATE_LIBRARY = 'libtensorflowlite_gpu_delegate.so'
+EDGETPU_DELEGATE_LIBRARY = 'libedgetpu.so.1'
+# Representative photos used to calibrate INT8 activation ranges
+CALIBRATION_DIR = os.environ.get('CALIBRATION_DIR', os.path.join(MODEL_DIR, 'calibration'))
+CALIBRATION_SAMPLES = 100
+IMAGENET_CLASS_INDEX_URL = 'https://storage.googleapis.com/download.tensorflow.org/data/imagenet_class_index.json'
+IMAGENET_CLASS_INDEX_PATH = os.path.join(MODEL_DIR, 'imagenet_class_index.json')
+# Image batches are split into chunks of at most MAX_IMAGE_BATCH and padded
+# to a bucket size, so only a few input shapes are ever allocated
+IMAGE_BATCH_BUCKETS = (1, 2, 4, 8)
+MAX_IMAGE_BATCH = IMAGE_BATCH_BUCKETS[-1]
+# Interpreters are pooled and used by one request at a time, so parallelism
+# comes from WSGI threads; up to TFLITE_POOL_SIZE idle ones are kept per batch size
+TFLITE_NUM_THREADS = int(os.environ.get('TFLITE_NUM_THREADS', 1))
+TFLITE_POOL_SIZE = int(os.environ.get('TFLITE_POOL_SIZE', 4))
+
+def image_model_path(precision):
+    """Path of the cached TFLite model for a given precision"""
+    return os.path.join(MODEL_DIR, f'mobilenet_v2_{precision}.tflite')
+
+@contextmanager
+def atomic_output(path):
+    """Yield a temp path next to path, moved into place only once fully written"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=os.path.splitext(path)[1])
+    os.close(fd)
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def pad_to_bucket(x):
+    """Zero-pad a batch of at most MAX_IMAGE_BATCH images up to its bucket size"""
+    bucket_size = next(size for size in IMAGE_BATCH_BUCKETS if size >= len(x))
+    if bucket_size == len(x):
+        return x
+    padding = np.zeros((bucket_size - len(x),) + x.shape[1:], dtype=x.dtype)
+    return np.concatenate([x, padding])
+
+def tflite_interpreter():
+    """Return (Interpreter, load_delegate), preferring the lightweight tflite_runtime"""
+    try:
+        from tflite_runtime.interpreter import Interpreter, load_delegate
+    except ImportError:
+        import tensorflow as tf
+        Interpreter, load_delegate = tf.lite.Interpreter, tf.lite.experimental.load_delegate
+    return Interpreter, load_delegate
+
+def load_imagenet_labels():
+    """Load the 1000 ImageNet class labels, caching the class index under MODEL_DIR"""
+    if not os.path.exists(IMAGENET_CLASS_INDEX_PATH):
+        with urllib.request.urlopen(IMAGENET_CLASS_INDEX_URL, timeout=30) as response:
+            class_index_json = response.read()
+        with atomic_output(IMAGENET_CLASS_INDEX_PATH) as tmp_path:
+            with open(tmp_path, 'wb') as f:
+                f.write(class_index_json)
+    
+    with open(IMAGENET_CLASS_INDEX_PATH, 'rb') as f:
+        class_index = orjson.loads(f.read())
+    return [class_index[str(i)][1] for i in range(len(class_index))]
+
+def load_calibration_images():
+    """Load up to CALIBRATION_SAMPLES 224x224 RGB photos from CALIBRATION_DIR"""
+    import cv2
+    
+    images = []
+    if not os.path.isdir(CALIBRATION_DIR):
+        return images
+    
+    for filename in sorted(os.listdir(CALIBRATION_DIR)):
+        image = cv2.imread(os.path.join(CALIBRATION_DIR, filename), cv2.IMREAD_COLOR)
+        if image is None:
+            continue  # Not an image
+        image = cv2.resize(image, (224, 224), interpolation=cv2.INTER_AREA)
+        images.append(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+        if len(images) == CALIBRATION_SAMPLES:
+            break
+    return images
+
+def build_keras_image_model():
+    """Build the ImageNet MobileNetV2 used for report image analysis"""
+    from tensorflow import keras
+    
+    return keras.applications.MobileNetV2(
+        weights='imagenet',
+        include_top=True,
+        input_shape=(224, 224, 3)
+    )
+
+def convert_image_model(model_path, precision='int8'):
+    """Convert MobileNetV2 to a post-training quantized TFLite model"""
+    import tensorflow as tf
+    
+    keras_model = build_keras_image_model()
+    
+    def representative_dataset():
+        images = load_calibration_images()
+        if not images:
+            logger.warning(
+                f"No calibration images found in {CALIBRATION_DIR}; calibrating INT8 model on "
+                f"synthetic noise, which degrades accuracy on real photos"
+            )
+            images = np.random.uniform(0, 255, (CALIBRATION_SAMPLES, 224, 224, 3))
+        
+        # Same [-1, 1] range as the inference-time preprocessing
+        for image in images:
+            yield [np.asarray(image, dtype=np.float32)[np.newaxis] / 127.5 - 1.0]
+    
+    converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    
+    if precision == 'int8':
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.uint8
+        converter.inference_output_type = tf.uint8
+    else:
+        # FP16 weights with float32 I/O, executable by GPU delegates
+        converter.target_spec.supported_types = [tf.float16]
+    
+    tflite_model = converter.convert()
+    with atomic_output(model_path) as tmp_path:
+        with open(tmp_path, 'wb') as f:
+            f.write(tflite_model)
+
+def export_onnx_model(model_path):
+    """Export MobileNetV2 to ONNX with a dynamic batch dimension"""
+    import tensorflow as tf
+    import tf2onnx
+    
+    input_signature = (tf.TensorSpec((None, 224, 224, 3), tf.float32, name='input'),)
+    with atomic_output(model_path) as tmp_path:
+        tf2onnx.convert.from_keras(build_keras_image_model(), input_signature=input_signature, output_path=tmp_path)
+
+class ImageModel:
+    """TFLite MobileNetV2 exposing a Keras-style predict()"""
+    
+    def __init__(self, model_path, precision, delegate_library=None, resizable=True):
+        self.model_path = model_path
+        self.precision = precision
+        self.delegate_library = delegate_library
+        self.resizable = resizable  # False for fixed-shape models such as Edge TPU
+        self._interpreter_class, self._load_delegate = tflite_interpreter()
+        self._lock = threading.Lock()
+        self._idle = {}  # batch size -> idle interpreters
+        with self.interpreter():
+            pass  # Fail fast on a bad model and keep one interpreter warm
+    
+    def _create_interpreter(self, batch_size):
+        """Build an interpreter with tensors allocated for a batch size"""
+        delegates = []
+        if self.delegate_library:
+            delegates.append(self._load_delegate(self.delegate_library))
+        elif self.precision == 'fp16':
+            try:
+                delegates.append(self._load_delegate(GPU_DELEGATE_LIBRARY))
+            except (ValueError, OSError):
+                pass  # No GPU available, run on CPU
+        
+        interpreter = self._interpreter_class(
+            model_path=self.model_path,
+            num_threads=TFLITE_NUM_THREADS,
+            experimental_delegates=delegates or None
+        )
+        if batch_size != 1:
+            input_index = interpreter.get_input_details()[0]['index']
+            interpreter.resize_tensor_input(input_index, [batch_size, 224, 224, 3])
+        interpreter.allocate_tensors()
+        return interpreter
+    
+    @contextmanager
+    def interpreter(self, batch_size=1):
+        """Borrow an idle interpreter for a batch size, building one if none is free"""
+        with self._lock:
+            idle = self._idle.get(batch_size)
+            interpreter = idle.pop() if idle else None
+        if interpreter is None:
+            interpreter = self._create_interpreter(batch_size)
+        
+        try:
+            yield interpreter
+        finally:
+            with self._lock:
+                idle = self._idle.setdefault(batch_size, [])
+                if len(idle) < TFLITE_POOL_SIZE:
+                    idle.append(interpreter)
+    
+    def predict(self, x):
+        """Run inference on a preprocessed float32 [N, 224, 224, 3] batch, N <= MAX_IMAGE_BATCH"""
+        if not self.resizable:
+            # Fixed input shape, run the images one at a time
+            return np.concatenate([self.invoke(x[i:i + 1]) for i in range(len(x))])
+        return self.invoke(pad_to_bucket(x))[:len(x)]
+    
+    def invoke(self, x):
+        """Run one interpreter invocation over the whole batch x"""
+        with self.interpreter(len(x)) as interpreter:
+            input_details = interpreter.get_input_details()[0]
+            output_details = interpreter.get_output_details()[0]
+            
+            # Quantize input for integer models
+            if input_details['dtype'] == np.uint8:
+                scale, zero_point = input_details['quantization']
+                x = np.clip(np.round(x / scale + zero_point), 0, 255).astype(np.uint8)
+            
+            interpreter.set_tensor(input_details['index'], x.astype(input_details['dtype'], copy=False))
+            interpreter.invoke()
+            predictions = interpreter.get_tensor(output_details['index'])
+        
+        # Dequantize output for decode_predictions
+        if output_details['dtype'] == np.uint8:
+            scale, zero_point = output_details['quantization']
+            predictions = (predictions.astype(np.float32) - zero_point) * scale
+        
+        return predictions
+
+class OnnxImageModel:
+    """ONNX Runtime MobileNetV2 exposing a Keras-style predict()"""
+    
+    def __init__(self, model_path):
+        import onnxruntime
+        
+        self.session = onnxruntime.InferenceSession(model_path, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+    
+    def predict(self, x):
+        """Run inference on a preprocessed float32 [N, 224, 224, 3] batch"""
+        return self.session.run(None, {self.input_name: x.astype(np.float32, copy=False)})[0]
+
+class KerasImageModel:
+    """Keras MobileNetV2 served through a persistent XLA-compiled concrete function"""
+    
+    def __init__(self):
+        import tensorflow as tf
+        
+        model = build_keras_image_model()
+        
+        @tf.function(input_signature=[tf.TensorSpec([None, 224, 224, 3], tf.float32)], jit_compile=True)
+        def infer(x):
+            return model(x, training=False)
+        
+        self.model = model
+        self.infer = infer.get_concrete_function()
+        self.convert_to_tensor = tf.convert_to_tensor
+    
+    def predict(self, x):
+        """Run inference on a preprocessed float32 [N, 224, 224, 3] batch, N <= MAX_IMAGE_BATCH"""
+        # XLA compiles once per input shape, so only bucket sizes ever reach it
+        predictions = self.infer(self.convert_to_tensor(pad_to_bucket(x), dtype='float32')).numpy()
+        return predictions[:len(x)]
+
+def load_image_model():
+    """Load the image model for the configured backend, falling back to TFLite"""
+    global imagenet_labels
+    try:
+        imagenet_labels = load_imagenet_labels()
+    except Exception as e:
+        logger.warning(f"Could not load ImageNet labels: {e}")
+        return None
+    
+    if IMAGE_MODEL_BACKEND == 'onnx':
+        try:
+            model_path = os.path.join(MODEL_DIR, 'mobilenet_v2.onnx')
+            if not os.path.exists(model_path):
+                export_onnx_model(model_path)
+            return OnnxImageModel(model_path)
+        except Exception as e:
+            logger.warning(f"Could not load ONNX image model: {e}")
+    elif IMAGE_MODEL_BACKEND == 'xla':
+        try:
+            return KerasImageModel()
+        except Exception as e:
+            logger.warning(f"Could not load XLA image model: {e}")
+    elif IMAGE_MODEL_BACKEND == 'edgetpu':
+        # Requires the INT8 model compiled offline with edgetpu_compiler
+        try:
+            return ImageModel(image_model_path('int8_edgetpu'), 'int8', EDGETPU_DELEGATE_LIBRARY, resizable=False)
+        except Exception as e:
+            logger.warning(f"Could not load Edge TPU image model: {e}")
+    
+    # Quantized TFLite, falling back to FP16 if INT8 fails
+    for precision in dict.fromkeys((IMAGE_MODEL_PRECISION, 'fp16')):
+        try:
+            model_path = image_model_path(precision)
+            if not os.path.exists(model_path):
+                convert_image_model(model_path, precision)
+            return ImageModel(model_path, precision)
+        except Exception as e:
+            logger.warning(f"Could not load {precision} image model: {e}")
+    return None
+
+class CompiledTreeModel:
+    """Treelite-compiled tree ensemble exposing the sklearn predict API"""
+    
+    def __init__(self, library_path):
+        import treelite_runtime
+        
+        self.predictor = treelite_runtime.Predictor(library_path)
+        self.dmatrix = treelite_runtime.DMatrix
+    
+    def _predict(self, x):
+        # treelite_runtime squeezes its output, so a single row would come back 0-d
+        return np.asarray(self.predictor.predict(self.dmatrix(x))).reshape(len(x), -1)
+    
+    def predict(self, x):
+        return self._predict(x).reshape(len(x))
+    
+    def predict_proba(self, x):
+        # Multi-class models are imported with a softmax output
+        return self._predict(x)
+
+def compile_tree_model(model, name):
+    """Compile a fitted tree ensemble to a native library, keeping sklearn on failure"""
+    # Targets the treelite 3.x API (export_lib + treelite_runtime). treelite 4
+    # moved code generation to tl2cgen, so there the sklearn model is kept.
+    if importlib.util.find_spec('treelite_runtime') is None:
+        return model
+    
+    try:
+        import treelite
+    except ImportError:
+        return model
+    
+    try:
+        library_path = os.path.join(MODEL_DIR, f'{name}.so')
+        with atomic_output(library_path) as tmp_path:
+            treelite.sklearn.import_model(model).export_lib(
+                toolchain='gcc',
+                libpath=tmp_path,
+                params={'parallel_comp': 1}
+            )
+            # Load this process's own build before another worker can replace it
+            compiled_model = CompiledTreeModel(tmp_path)
+        return compiled_model
+    except Exception as e:
+        logger.warning(f"Could not compile {name} model: {e}")
+        return model
+
+# Model input layout: current readings, historical trends, then rolling means
+_FEATS = (
+    ('windSpeed', 0.0),
+    ('pressure', 1013.0),
+    ('waveHeight', 1.0),
+    ('seaLevel', 0.0),
+    ('temperature', 25.0),
+    ('humidity', 50.0),
+    ('visibility', 10.0),
+    ('waterQuality', 100.0)
+)
+_TREND_FEATS = (
+    ('windSpeed', 0.0),
+    ('pressure', 1013.0)
+)
+# Positions of the trend features among the current readings
+_TREND_CURRENT_INDICES = [[key for key, _ in _FEATS].index(key) for key, _ in _TREND_FEATS]
+_ROLLING_WINDOW = 6
+N_FEATURES = len(_FEATS) + 2 * len(_TREND_FEATS)
 
 # Initialize models
 def load_models():
-    global threat_model, severity_model, image_model, scaler
+    global threat_model, severity_model, image_model, scaler, _MEAN, _SCALE, _fallback_kernel
     
     try:
         # Load pre-trained models (you'll need to train these)
         # For demo, we'll create simple models
-        threat_model = RandomForestRegressor(n_estimators=100, random_state=42)
-        severity_model = GradientBoostingClassifier(n_estimators=100, random_state=42)
+        regressor = RandomForestRegressor(n_estimators=100, random_state=42)
+        # treelite can only import gradient boosting trained with init='zero'
+        classifier = GradientBoostingClassifier(n_estimators=100, init='zero', random_state=42)
         
         # Create dummy training data for demonstration
-        X_dummy = np.random.rand(1000, 8)  # 8 features
+        X_dummy = np.random.rand(1000, N_FEATURES)
         y_threat = np.random.rand(1000) * 100  # Threat score 0-100
         y_severity = np.random.randint(0, 4, 1000)  # 0=low, 1=medium, 2=high, 3=critical
         
-        scaler.fit(X_dummy)
-        threat_model.fit(X_dummy, y_threat)
-        severity_model.fit(X_dummy, y_severity)
+        fitted_scaler = StandardScaler().fit(X_dummy)
+        regressor.fit(X_dummy, y_threat)
+        classifier.fit(X_dummy, y_severity)
+        
+        scaler = fitted_scaler
+        _MEAN = scaler.mean_.astype(np.float32)
+        _SCALE = scaler.scale_.astype(np.float32)
+        
+        # Compile tree ensembles to native code
+        severity_model = compile_tree_model(classifier, 'severity')
+        threat_model = compile_tree_model(regressor, 'threat')
         
         # Load image classification model (for report analysis)
-        try:
-            image_model = keras.applications.MobileNetV2(
-                weights='imagenet',
-                include_top=True,
-                input_shape=(224, 224, 3)
-            )
-        except Exception as e:
-            logger.warning(f"Could not load image model: {e}")
-            image_model = None
+        image_model = load_image_model()
         
         logger.info("AI models loaded successfully")
     except Exception as e:
         logger.error(f"Model loading error: {e}")
+    
+    # JIT-compile the fallback kernel now rather than inside the first request
+    try:
+        _fallback_kernel(0.0, 1013.0, 1.0, 0.0)
+    except Exception as e:
+        logger.warning(f"Could not compile fallback kernel, using plain Python: {e}")
+        _fallback_kernel = _fallback_core
+
+SEVERITY_LABELS = ('low', 'medium', 'high', 'critical')
+
+def _fallback_core(wind_speed, pressure, wave_height, sea_level):
+    """Rule-based risk ladder returning (risk_score, severity_idx, confidence)"""
+    risk_score = 0
+    
+    # Risk calculation
+    if wind_speed > 80: risk_score += 40
+    elif wind_speed > 60: risk_score += 25
+    elif wind_speed > 40: risk_score += 10
+    
+    if pressure < 990: risk_score += 30
+    elif pressure < 1000: risk_score += 15
+    elif pressure < 1010: risk_score += 5
+    
+    if wave_height > 4: risk_score += 20
+    elif wave_height > 3: risk_score += 10
+    elif wave_height > 2: risk_score += 5
+    
+    if sea_level > 3: risk_score += 15
+    elif sea_level > 2: risk_score += 8
+    
+    # Determine severity
+    if risk_score >= 80: severity_idx = 3
+    elif risk_score >= 60: severity_idx = 2
+    elif risk_score >= 30: severity_idx = 1
+    else: severity_idx = 0
+    
+    confidence = min(95.0, 50 + risk_score * 0.8)
+    
+    return risk_score, severity_idx, confidence
+
+# _fallback_core JIT-compiled with numba when it is installed, plain Python otherwise
+try:
+    _fallback_kernel = njit(cache=True)(_fallback_core) if njit else _fallback_core
+except Exception as e:
+    # e.g. njit(cache=True) finding no writable cache location
+    logger.warning(f"Could not JIT the fallback kernel, using plain Python: {e}")
+    _fallback_kernel = _fallback_core
 
 class ThreatPredictor:
     def _init_(self):
@@ -83,38 +524,34 @@ class ThreatPredictor:
         """Extract features for ML model"""
         try:
             current = environmental_data
-            features = []
+            features = np.zeros((1, N_FEATURES), dtype=np.float32)
             
             # Current environmental features
-            features.extend([
-                float(current.get('windSpeed', {}).get('value', 0)),
-                float(current.get('pressure', {}).get('value', 1013)),
-                float(current.get('waveHeight', {}).get('value', 1)),
-                float(current.get('seaLevel', {}).get('value', 0)),
-                float(current.get('temperature', {}).get('value', 25)),
-                float(current.get('humidity', {}).get('value', 50)),
-                float(current.get('visibility', {}).get('value', 10)),
-                float(current.get('waterQuality', {}).get('value', 100))
-            ])
+            for i, (key, default) in enumerate(_FEATS):
+                reading = current.get(key)
+                features[0, i] = reading.get('value', default) if reading else default
             
-            # Historical trend features
-            if historical_data and len(historical_data) > 1:
-                wind_trend = self.calculate_trend([d.get('windSpeed', 0) for d in historical_data[-24:]])
-                pressure_trend = self.calculate_trend([d.get('pressure', 1013) for d in historical_data[-24:]])
-                features.extend([wind_trend, pressure_trend])
+            # Historical trend and rolling mean features
+            if historical_data:
+                features[0, len(_FEATS):] = self.calculate_history_features(historical_data[-24:])
             else:
-                features.extend([0, 0])
+                # Zero trends, and the current readings stand in for the rolling means
+                features[0, len(_FEATS) + len(_TREND_FEATS):] = features[0, _TREND_CURRENT_INDICES]
             
-            return np.array(features).reshape(1, -1)
+            return features
         except Exception as e:
             logger.error(f"Feature extraction error: {e}")
-            return np.zeros((1, 10))
+            return np.zeros((1, N_FEATURES), dtype=np.float32)
     
-    def calculate_trend(self, values):
-        """Calculate trend in data"""
-        if len(values) < 2:
-            return 0
-        return (values[-1] - values[0]) / len(values)
+    def calculate_history_features(self, historical_data):
+        """Calculate trends and rolling means for all trend features at once"""
+        history = np.array(
+            [[d.get(key, default) for key, default in _TREND_FEATS] for d in historical_data],
+            dtype=np.float32
+        )
+        trends = (history[-1] - history[0]) / len(history)
+        rolling_means = history[-_ROLLING_WINDOW:].mean(axis=0)
+        return np.concatenate([trends, rolling_means])
     
     def predict_threat_level(self, environmental_data, historical_data=None):
         """Predict threat level using ML model"""
@@ -125,28 +562,26 @@ class ThreatPredictor:
                 return self.fallback_prediction(environmental_data)
             
             # Normalize features
-            features_scaled = scaler.transform(features)
+            features_scaled = (features - _MEAN) / _SCALE
             
             # Predict threat score and severity
             threat_score = threat_model.predict(features_scaled)[0]
             severity_prob = severity_model.predict_proba(features_scaled)[0]
-            severity_class = severity_model.predict(features_scaled)[0]
-            
-            severity_labels = ['low', 'medium', 'high', 'critical']
+            severity_class = int(severity_prob.argmax())
             
             # Calculate confidence based on model certainty
-            confidence = max(severity_prob) * 100
+            confidence = severity_prob.max() * 100
             
             # Generate recommendations
             recommendations = self.generate_recommendations(
-                severity_labels[severity_class], 
+                SEVERITY_LABELS[severity_class], 
                 threat_score, 
                 environmental_data
             )
             
             return {
                 'threat_score': float(threat_score),
-                'severity': severity_labels[severity_class],
+                'severity': SEVERITY_LABELS[severity_class],
                 'confidence': float(confidence),
                 'recommendations': recommendations,
                 'model_version': 'v2.1',
@@ -159,41 +594,19 @@ class ThreatPredictor:
     
     def fallback_prediction(self, data):
         """Fallback prediction when ML model fails"""
-        risk_score = 0
-        
         wind_speed = float(data.get('windSpeed', {}).get('value', 0))
         pressure = float(data.get('pressure', {}).get('value', 1013))
         wave_height = float(data.get('waveHeight', {}).get('value', 1))
         sea_level = float(data.get('seaLevel', {}).get('value', 0))
         
-        # Risk calculation
-        if wind_speed > 80: risk_score += 40
-        elif wind_speed > 60: risk_score += 25
-        elif wind_speed > 40: risk_score += 10
-        
-        if pressure < 990: risk_score += 30
-        elif pressure < 1000: risk_score += 15
-        elif pressure < 1010: risk_score += 5
-        
-        if wave_height > 4: risk_score += 20
-        elif wave_height > 3: risk_score += 10
-        elif wave_height > 2: risk_score += 5
-        
-        if sea_level > 3: risk_score += 15
-        elif sea_level > 2: risk_score += 8
-        
-        # Determine severity
-        if risk_score >= 80: severity = 'critical'
-        elif risk_score >= 60: severity = 'high'
-        elif risk_score >= 30: severity = 'medium'
-        else: severity = 'low'
-        
-        confidence = min(95, 50 + risk_score * 0.8)
+        risk_score, severity_idx, confidence = _fallback_kernel(wind_speed, pressure, wave_height, sea_level)
+        risk_score = int(risk_score)
+        severity = SEVERITY_LABELS[severity_idx]
         
         return {
             'threat_score': risk_score,
             'severity': severity,
-            'confidence': confidence,
+            'confidence': float(confidence),
             'recommendations': self.generate_recommendations(severity, risk_score, data),
             'model_version': 'fallback_v1.0',
             'prediction_time': datetime.utcnow().isoformat()
@@ -242,125 +655,212 @@ class ThreatPredictor:
         
         return recommendations
 
+# Report keyword categories
+SEVERITY_KEYWORDS = {
+    'critical': ['emergency', 'disaster', 'catastrophic', 'severe', 'massive', 'devastating'],
+    'high': ['dangerous', 'serious', 'major', 'significant', 'extensive'],
+    'medium': ['moderate', 'concerning', 'noticeable', 'unusual'],
+    'low': ['minor', 'slight', 'small', 'light']
+}
+
+TAG_KEYWORDS = {
+    'weather': ['wind', 'rain', 'storm', 'cyclone', 'hurricane'],
+    'water': ['wave', 'tide', 'flood', 'tsunami', 'surge'],
+    'infrastructure_damage': ['damage', 'destruction', 'broken', 'collapsed'],
+    'pollution': ['oil', 'chemical', 'waste', 'pollution', 'contamination']
+}
+
+CREDIBILITY_KEYWORDS = {
+    'location': ['km', 'meter', 'coast', 'beach', 'shore', 'village', 'town'],
+    'time': ['morning', 'evening', 'hour', 'minute', 'yesterday', 'today']
+}
+
+def build_keyword_automaton():
+    """Build one Aho-Corasick automaton over every report keyword category"""
+    automaton = ahocorasick.Automaton()
+    for keyword_sets in (SEVERITY_KEYWORDS, TAG_KEYWORDS, CREDIBILITY_KEYWORDS):
+        for category, keywords in keyword_sets.items():
+            for keyword in keywords:
+                hits = automaton.get(keyword, ())
+                automaton.add_word(keyword, hits + ((category, keyword),))
+    automaton.make_automaton()
+    return automaton
+
+KEYWORD_AUTOMATON = build_keyword_automaton()
+_DIGIT_RE = re.compile(r'\d')
+
+# Decoded attachments keyed by SHA-1 of their base64 payload
+IMAGE_CACHE_SIZE = 256
+_image_cache = OrderedDict()
+_image_cache_lock = threading.Lock()
+
+# Shared pool for concurrent report text and image analysis
+_POOL = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1))
+
 class ReportAnalyzer:
-    def _init_(self):
-        self.severity_keywords = {
-            'critical': ['emergency', 'disaster', 'catastrophic', 'severe', 'massive', 'devastating'],
-            'high': ['dangerous', 'serious', 'major', 'significant', 'extensive'],
-            'medium': ['moderate', 'concerning', 'noticeable', 'unusual'],
-            'low': ['minor', 'slight', 'small', 'light']
-        }
-        
+    def match_keywords(self, text):
+        """Scan lowered text once, returning matched keywords per category"""
+        matches = {}
+        for _, hits in KEYWORD_AUTOMATON.iter(text):
+            for category, keyword in hits:
+                matches.setdefault(category, set()).add(keyword)
+        return matches
+
     def analyze_text(self, description):
         """Analyze report text for severity and credibility"""
         text = description.lower()
+        text_len = len(description)
+        has_digit = bool(_DIGIT_RE.search(description))
+        matches = self.match_keywords(text)
         
-        severity_scores = {}
-        for severity, keywords in self.severity_keywords.items():
-            score = sum(1 for keyword in keywords if keyword in text)
-            severity_scores[severity] = score
+        severity_scores = {
+            severity: len(matches.get(severity, ()))
+            for severity in SEVERITY_KEYWORDS
+        }
         
         # Determine severity based on keyword matching
         predicted_severity = max(severity_scores, key=severity_scores.get)
         
         # Calculate credibility based on text quality
-        credibility = self.calculate_credibility(description)
+        credibility = self.calculate_credibility(text, text_len, has_digit, matches)
         
         # Extract tags
-        tags = self.extract_tags(text)
+        tags = self.extract_tags(matches)
         
         return {
             'predicted_severity': predicted_severity,
             'severity_confidence': max(severity_scores.values()) * 20,
             'credibility': credibility,
             'tags': tags,
-            'text_quality': len(description) > 50 and any(char.isdigit() for char in description)
+            'text_quality': text_len > 50 and has_digit
         }
     
-    def calculate_credibility(self, text):
-        """Calculate report credibility score"""
+    def calculate_credibility(self, text_lower, text_len, has_digit, matches):
+        """Calculate report credibility score from precomputed text properties"""
         score = 50  # Base score
         
         # Length bonus
-        if len(text) > 100: score += 15
-        elif len(text) > 50: score += 10
+        if text_len > 100: score += 15
+        elif text_len > 50: score += 10
         
         # Detail bonus (numbers, times, measurements)
-        if any(char.isdigit() for char in text): score += 10
+        if has_digit: score += 10
         
         # Grammar and spelling (simplified check)
-        words = text.split()
+        words = text_lower.split()
         if len(words) > 10: score += 5
         
         # Specific location mentions
-        location_keywords = ['km', 'meter', 'coast', 'beach', 'shore', 'village', 'town']
-        if any(keyword in text.lower() for keyword in location_keywords): score += 10
+        if 'location' in matches: score += 10
         
         # Time mentions
-        time_keywords = ['morning', 'evening', 'hour', 'minute', 'yesterday', 'today']
-        if any(keyword in text.lower() for keyword in time_keywords): score += 5
+        if 'time' in matches: score += 5
         
         return min(100, score)
     
-    def extract_tags(self, text):
-        """Extract relevant tags from report text"""
-        tags = []
-        
-        weather_keywords = ['wind', 'rain', 'storm', 'cyclone', 'hurricane']
-        if any(keyword in text for keyword in weather_keywords):
-            tags.append('weather')
-        
-        water_keywords = ['wave', 'tide', 'flood', 'tsunami', 'surge']
-        if any(keyword in text for keyword in water_keywords):
-            tags.append('water')
+    def extract_tags(self, matches):
+        """Extract relevant tags from matched report keywords"""
+        return [tag for tag in TAG_KEYWORDS if tag in matches]
+
+    def load_image(self, image_data):
+        """Decode a base64 image into a cached 224x224 RGB uint8 array"""
+        key = hashlib.sha1(image_data.encode()).digest()
+        with _image_cache_lock:
+            image_array = _image_cache.get(key)
+            if image_array is not None:
+                _image_cache.move_to_end(key)
+                return image_array
         
-        damage_keywords = ['damage', 'destruction', 'broken', 'collapsed']
-        if any(keyword in text for keyword in damage_keywords):
-            tags.append('infrastructure_damage')
+        import cv2
         
-        pollution_keywords = ['oil', 'chemical', 'waste', 'pollution', 'contamination']
-        if any(keyword in text for keyword in pollution_keywords):
-            tags.append('pollution')
+        image_bytes = base64.b64decode(image_data)
+        image = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError("Unsupported or corrupt image data")
+        image = cv2.resize(image, (224, 224), interpolation=cv2.INTER_AREA)
+        image_array = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        image_array.setflags(write=False)  # Shared between requests
         
-        return tags
+        with _image_cache_lock:
+            _image_cache[key] = image_array
+            if len(_image_cache) > IMAGE_CACHE_SIZE:
+                _image_cache.popitem(last=False)
+        return image_array
+
+    def try_load_image(self, image_data):
+        """Load an image, returning (image_array, error) instead of raising"""
+        try:
+            return self.load_image(image_data), None
+        except Exception as e:
+            return None, e
 
     def analyze_image(self, image_data):
         """Analyze uploaded images for disaster-related content"""
-        try:
-            if image_model is None:
-                return {'confidence': 0, 'tags': [], 'analysis': 'Image analysis unavailable'}
-            
-            # Decode base64 image
-            image_bytes = base64.b64decode(image_data)
-            image = Image.open(io.BytesIO(image_bytes))
-            
-            # Preprocess image
-            image = image.resize((224, 224))
-            image_array = keras.preprocessing.image.img_to_array(image)
-            image_array = np.expand_dims(image_array, axis=0)
-            image_array = keras.applications.mobilenet_v2.preprocess_input(image_array)
-            
-            # Predict
-            predictions = image_model.predict(image_array)
-            decoded_predictions = keras.applications.mobilenet_v2.decode_predictions(predictions, top=5)[0]
-            
-            # Map predictions to disaster relevance
-            disaster_keywords = ['water', 'storm', 'cloud', 'wave', 'wind', 'damage', 'debris']
+        return self.analyze_images([image_data])[0]
+
+    def analyze_images(self, images_data):
+        """Analyze several base64 images with a single model invocation"""
+        if image_model is None:
+            return [{'confidence': 0, 'tags': [], 'analysis': 'Image analysis unavailable'} for _ in images_data]
+        
+        results = [None] * len(images_data)
+        batch_indices, batch_images = [], []
+        
+        # Decode attachments concurrently, cv2 releases the GIL
+        for i, (image_array, error) in enumerate(_POOL.map(self.try_load_image, images_data)):
+            if error is None:
+                batch_images.append(image_array)
+                batch_indices.append(i)
+            else:
+                logger.error(f"Image analysis error: {error}")
+                results[i] = {'confidence': 0, 'error': str(error)}
+        
+        if batch_images:
+            try:
+                batch_results = self.analyze_images_batch(np.stack(batch_images).astype(np.float32))
+            except Exception as e:
+                logger.error(f"Image analysis error: {e}")
+                batch_results = [{'confidence': 0, 'error': str(e)}] * len(batch_images)
+            for i, result in zip(batch_indices, batch_results):
+                results[i] = result
+        
+        return results
+
+    def analyze_images_batch(self, image_batch):
+        """Run MobileNetV2 once over an [N, 224, 224, 3] batch"""
+        # MobileNetV2 preprocess_input: scale pixels to [-1, 1]
+        image_batch = image_batch / 127.5 - 1.0
+        
+        # Predict in bounded chunks
+        predictions = np.concatenate([
+            image_model.predict(image_batch[i:i + MAX_IMAGE_BATCH])
+            for i in range(0, len(image_batch), MAX_IMAGE_BATCH)
+        ])
+        
+        # Top-5 ImageNet labels per image, highest score first
+        top_indices = np.argsort(predictions, axis=1)[:, :-6:-1]
+        decoded_batch = [
+            [(imagenet_labels[index], float(scores[index])) for index in indices]
+            for scores, indices in zip(predictions, top_indices)
+        ]
+        
+        # Map predictions to disaster relevance
+        disaster_keywords = ['water', 'storm', 'cloud', 'wave', 'wind', 'damage', 'debris']
+        results = []
+        
+        for decoded_predictions in decoded_batch:
             relevance_score = 0
-            
-            for _, label, confidence in decoded_predictions:
+            for label, confidence in decoded_predictions:
                 if any(keyword in label.lower() for keyword in disaster_keywords):
                     relevance_score += confidence
             
-            return {
+            results.append({
                 'relevance_score': float(relevance_score),
-                'top_predictions': [(label, float(conf)) for _, label, conf in decoded_predictions],
+                'top_predictions': decoded_predictions,
                 'disaster_related': relevance_score > 0.3
-            }
-            
-        except Exception as e:
-            logger.error(f"Image analysis error: {e}")
-            return {'confidence': 0, 'error': str(e)}
+            })
+        
+        return results
 
 # Initialize components
 threat_predictor = ThreatPredictor()
@@ -426,21 +926,33 @@ def analyze_report():
         description = data.get('description', '')
         attachments = data.get('attachments', [])
         
-        # Analyze text content
-        text_analysis = report_analyzer.analyze_text(description)
-        
         # Analyze images if present
         image_analyses = []
+        pending_analyses, pending_images = [], []
         for attachment in attachments:
             if attachment.get('mimetype', '').startswith('image/'):
-                # In real implementation, you'd fetch and analyze the image
-                image_analysis = {
-                    'filename': attachment.get('filename'),
-                    'disaster_related': True,
-                    'confidence': np.random.uniform(0.6, 0.9)
-                }
+                image_analysis = {'filename': attachment.get('filename')}
+                if attachment.get('data'):
+                    # Inline image content is analyzed below in one batch
+                    pending_analyses.append(image_analysis)
+                    pending_images.append(attachment['data'])
+                else:
+                    # In real implementation, you'd fetch and analyze the image
+                    image_analysis.update({
+                        'disaster_related': True,
+                        'confidence': np.random.uniform(0.6, 0.9)
+                    })
                 image_analyses.append(image_analysis)
         
+        if pending_images:
+            # Analyze text content while images are processed
+            text_future = _POOL.submit(report_analyzer.analyze_text, description)
+            for image_analysis, result in zip(pending_analyses, report_analyzer.analyze_images(pending_images)):
+                image_analysis.update(result)
+            text_analysis = text_future.result()
+        else:
+            text_analysis = report_analyzer.analyze_text(description)
+        
         # Calculate overall confidence
         base_confidence = text_analysis['credibility']
         evidence_bonus = len(attachments) * 10
@@ -555,20 +1067,19 @@ def real_time_analysis():
         return jsonify({'error': str(e)}), 500
 
 # Helper functions
+
+# Known coastal cities (Kutch, Kandla, Veraval, Porbandar) as (lat, lng)
+# Simplified - in reality, you'd use actual coastline data
+_COAST = np.array([
+    [23.7337, 68.7333],
+    [23.0333, 70.2167],
+    [20.9167, 70.3667],
+    [21.6417, 69.6293]
+], dtype=np.float32)
+
 def calculate_coastal_proximity_factor(lat, lng):
     """Calculate risk factor based on coastal proximity"""
-    # Simplified - in reality, you'd use actual coastline data
-    known_coastal_cities = {
-        'kutch': (23.7337, 68.7333),
-        'kandla': (23.0333, 70.2167),
-        'veraval': (20.9167, 70.3667),
-        'porbandar': (21.6417, 69.6293)
-    }
-    
-    min_distance = float('inf')
-    for city_coords in known_coastal_cities.values():
-        distance = ((lat - city_coords[0])*2 + (lng - city_coords[1])2)*0.5
-        min_distance = min(min_distance, distance)
+    min_distance = np.min(np.hypot(_COAST[:, 0] - lat, _COAST[:, 1] - lng))
     
     # Closer to coast = higher risk factor
     if min_distance < 0.1: return 1.5  # Very close to coast
@@ -609,25 +1120,36 @@ def check_severity_consistency(reported_severity, predicted_severity):
     elif difference == 2: return 0   # Moderate difference
     else: return -10  # Significant difference
 
+SEVERITY_ADJECTIVES = {
+    'low': 'Minor',
+    'medium': 'Moderate', 
+    'high': 'Severe',
+    'critical': 'Critical'
+}
+
+THREAT_TYPE_TITLES = {
+    'cyclone': 'Cyclonic Storm',
+    'tsunami': 'Tsunami Warning',
+    'flood': 'Coastal Flooding',
+    'pollution': 'Marine Pollution',
+    'storm_surge': 'Storm Surge',
+    'erosion': 'Coastal Erosion'
+}
+
+# Alert titles for every (threat_type, severity) pair, built once at import
+_TITLES = {
+    (threat_type, severity): f"{adjective} {title}"
+    for threat_type, title in THREAT_TYPE_TITLES.items()
+    for severity, adjective in SEVERITY_ADJECTIVES.items()
+}
+_DEFAULT_TITLES = {
+    severity: f"{adjective} Coastal Threat"
+    for severity, adjective in SEVERITY_ADJECTIVES.items()
+}
+
 def generate_alert_title(threat_type, severity):
     """Generate descriptive alert titles"""
-    severity_adjectives = {
-        'low': 'Minor',
-        'medium': 'Moderate', 
-        'high': 'Severe',
-        'critical': 'Critical'
-    }
-    
-    type_titles = {
-        'cyclone': 'Cyclonic Storm',
-        'tsunami': 'Tsunami Warning',
-        'flood': 'Coastal Flooding',
-        'pollution': 'Marine Pollution',
-        'storm_surge': 'Storm Surge',
-        'erosion': 'Coastal Erosion'
-    }
-    
-    return f"{severity_adjectives[severity]} {type_titles.get(threat_type, 'Coastal Threat')}"
+    return _TITLES.get((threat_type, severity)) or _DEFAULT_TITLES[severity]
 
 def generate_alert_description(threat_type, env_data, prediction):
     """Generate detailed alert descriptions"""
@@ -803,9 +1325,11 @@ def continuous_monitoring():
             time.sleep(60)
 
 # Initialize models and start background monitoring
+# Load synchronously so gunicorn --preload workers inherit the loaded models
 load_models()
 monitoring_thread = threading.Thread(target=continuous_monitoring, daemon=True)
 monitoring_thread.start()
 
-if _name_ == '_main_':
+# Production: gunicorn --workers N --threads 4 app:app
+if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
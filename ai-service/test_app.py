@@ -0,0 +1,47 @@
+# ai-service/test_app.py
+import sys
+import types
+
+import numpy as np
+import pytest
+
+import app
+
+
+class FakePredictor:
+    """Mimics treelite_runtime 3.x Predictor, including its squeezed output"""
+
+    def __init__(self, library_path):
+        self.num_class = 4 if 'severity' in library_path else 1
+
+    def predict(self, dmatrix):
+        n = len(dmatrix)
+        out_result = np.full(n * self.num_class, 1.0 / self.num_class, dtype=np.float32)
+        return out_result.reshape((n, -1)).squeeze()
+
+
+@pytest.fixture
+def fake_treelite_runtime(monkeypatch):
+    module = types.ModuleType('treelite_runtime')
+    module.Predictor = FakePredictor
+    module.DMatrix = np.asarray
+    monkeypatch.setitem(sys.modules, 'treelite_runtime', module)
+
+
+def test_compiled_tree_model_single_row(fake_treelite_runtime):
+    features = np.zeros((1, app.N_FEATURES), dtype=np.float32)
+
+    threat = app.CompiledTreeModel('threat.so').predict(features)
+    assert threat.shape == (1,)
+    assert threat[0] == pytest.approx(1.0)
+
+    severity = app.CompiledTreeModel('severity.so').predict_proba(features)
+    assert severity.shape == (1, 4)
+    assert severity[0] == pytest.approx([0.25] * 4)
+
+
+def test_compiled_tree_model_batch(fake_treelite_runtime):
+    features = np.zeros((3, app.N_FEATURES), dtype=np.float32)
+
+    assert app.CompiledTreeModel('threat.so').predict(features).shape == (3,)
+    assert app.CompiledTreeModel('severity.so').predict_proba(features).shape == (3, 4)